@@ -5,6 +5,7 @@ import re
 from werkzeug.utils import secure_filename
 from aadhar import extract_text_from_pdf as extract_aadhaar_text, extract_aadhaar_details
 from pan import extract_text_from_pdf as extract_pan_text, extract_pan_details
+from profiling import PROFILE_ENABLED, SORT_KEYS, profiled, list_traces, dump_trace
 
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
 CORS(app)
@@ -19,6 +20,7 @@ def index():
     return app.send_static_file('index.html')
 
 @app.route('/extract_aadhaar', methods=['POST'])
+@profiled
 def extract_aadhaar():
     """API endpoint to extract Aadhaar details from uploaded PDF"""
     # Check if the post request has the file part
@@ -88,6 +90,7 @@ def extract_aadhaar():
         return jsonify({"error": "Only PDF files are allowed"}), 400
 
 @app.route('/extract_pan', methods=['POST'])
+@profiled
 def extract_pan():
     """API endpoint to extract PAN details from uploaded PDF"""
     # Check if the post request has the file part
@@ -126,5 +129,29 @@ def extract_pan():
     else:
         return jsonify({"error": "Only PDF files are allowed"}), 400
 
+@app.route('/profiles', methods=['GET'])
+def profiles():
+    """List the slowest recent profiled requests"""
+    if not PROFILE_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify({"status": "success", "data": list_traces(limit)})
+
+@app.route('/profiles/<trace_id>', methods=['GET'])
+def profile_report(trace_id):
+    """Dump the cProfile report of a stored request trace"""
+    if not PROFILE_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    
+    sort_by = request.args.get('sort', 'cumulative')
+    if sort_by not in SORT_KEYS:
+        return jsonify({"error": f"Unknown sort key, use one of: {', '.join(sorted(SORT_KEYS))}"}), 400
+    
+    report = dump_trace(trace_id, sort_by=sort_by)
+    if report is None:
+        return jsonify({"error": "Trace not found"}), 404
+    return report, 200, {'Content-Type': 'text/plain'}
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,136 @@
+import os
+import re
+import math
+import logging
+import tempfile
+from pdf2image import convert_from_path, pdfinfo_from_path
+from profiling import note
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of bytes of page buffers allowed to be alive at once per request
+PAGE_MEMORY_BUDGET = int(os.environ.get('PAGE_MEMORY_BUDGET', 64 * 1024 * 1024))  # 64MB
+PAGE_DPI = 200
+
+# Upper page bound passed to pdfinfo so it reports every page size; pdfinfo clamps it to the page count
+MAX_PAGES = 10000
+
+class PageBudget:
+    """Track the page buffers alive for a single request"""
+
+    def __init__(self, limit=PAGE_MEMORY_BUDGET):
+        self.limit = limit
+        self.live_bytes = 0
+        self.peak_bytes = 0
+        self.pages = 0
+
+    def plan(self, page_bytes):
+        """Split pages into (first_page, last_page) batches whose render cost fits in the budget.
+        A page larger than the whole budget gets a batch of its own."""
+        batches = []
+        first_page, batch_bytes = 1, 0
+        for number, size in enumerate(page_bytes, start=1):
+            size = _render_cost(size)
+            if number > first_page and batch_bytes + size > self.limit:
+                batches.append((first_page, number - 1))
+                first_page, batch_bytes = number, 0
+            batch_bytes += size
+        if page_bytes:
+            batches.append((first_page, len(page_bytes)))
+        return batches
+
+    def acquire(self, nbytes):
+        self.live_bytes += nbytes
+        self.peak_bytes = max(self.peak_bytes, self.live_bytes)
+
+    def release(self, nbytes):
+        self.live_bytes -= nbytes
+
+def _rss_bytes():
+    """Resident memory of this process, or None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _page_sizes(info, page_count):
+    """Page sizes in points from pdfinfo output, falling back to the first page size (or A4)"""
+    sizes = {}
+    for key, value in info.items():
+        page = re.match(r'Page\s+(\d+)\s+size', key)
+        dims = re.match(r'([\d.]+)\s*x\s*([\d.]+)', value) if isinstance(value, str) else None
+        if page and dims:
+            sizes[int(page.group(1))] = (float(dims.group(1)), float(dims.group(2)))
+        elif key == 'Page size' and dims:
+            sizes.setdefault(0, (float(dims.group(1)), float(dims.group(2))))
+    fallback = sizes.get(1, sizes.get(0, (595.0, 842.0)))
+    return [sizes.get(number, fallback) for number in range(1, page_count + 1)]
+
+def _page_bytes(width, height, dpi=PAGE_DPI):
+    """Size of a grayscale page buffer rendered from a page of the given size in points"""
+    return math.ceil(width / 72 * dpi) * math.ceil(height / 72 * dpi)
+
+def _render_cost(page_bytes):
+    """Memory needed to render a page: pdf2image holds the pdftoppm output
+    of the whole batch while it decodes it into images"""
+    return 2 * page_bytes
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+def _render(pdf_path, first_page, last_page, page_bytes, budget):
+    """Render a page range as grayscale (mode L) images"""
+    cost = sum(_render_cost(size) for size in page_bytes[first_page - 1:last_page])
+    if cost > budget.limit:
+        logger.warning("Page %d needs %d bytes to render, over the page memory budget of %d bytes",
+                       first_page, cost, budget.limit)
+    budget.acquire(cost)
+    try:
+        images = convert_from_path(pdf_path, dpi=PAGE_DPI, first_page=first_page, last_page=last_page,
+                                   grayscale=True)
+    finally:
+        budget.release(cost)
+    for image in images:
+        budget.acquire(_image_bytes(image))
+    return images
+
+def render_pages(pdf_bytes, budget=None):
+    """Yield the pages of a PDF as grayscale images, keeping at most
+    as many pages alive as fit in the memory budget"""
+    budget = budget or PageBudget()
+    # RSS is process wide, so concurrent requests show up in each other's numbers
+    rss_before = _rss_bytes()
+    note(bytes=len(pdf_bytes))
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            # Write the PDF once and render every batch from the same file
+            pdf_path = os.path.join(folder, 'document.pdf')
+            with open(pdf_path, 'wb') as f:
+                f.write(pdf_bytes)
+
+            info = pdfinfo_from_path(pdf_path, first_page=1, last_page=MAX_PAGES)
+            page_count = info["Pages"]
+            note(pages=page_count)
+            page_bytes = [_page_bytes(*size) for size in _page_sizes(info, page_count)]
+
+            for first_page, last_page in budget.plan(page_bytes):
+                batch = _render(pdf_path, first_page, last_page, page_bytes, budget)
+                try:
+                    while batch:
+                        page = batch.pop(0)
+                        budget.pages += 1
+                        try:
+                            yield page
+                        finally:
+                            budget.release(_image_bytes(page))
+                            del page
+                finally:
+                    # Pages not yet handed out when OCR failed
+                    for page in batch:
+                        budget.release(_image_bytes(page))
+    finally:
+        rss_after = _rss_bytes()
+        logger.info("Rendered %d pages, peak page memory %d bytes (budget %d), RSS %s -> %s bytes",
+                    budget.pages, budget.peak_bytes, budget.limit, rss_before, rss_after)
+        note(page_memory_peak=budget.peak_bytes, rss_before=rss_before, rss_after=rss_after)
@@ -1,10 +1,11 @@
 from flask import Flask, request, jsonify
 import pytesseract
-from pdf2image import convert_from_bytes
 import re
 import os
 import platform
 from werkzeug.utils import secure_filename
+from pages import render_pages
+from profiling import timed
 from datetime import datetime
 
 app = Flask(__name__)
@@ -29,14 +30,14 @@ def allowed_file(filename):
 def extract_text_from_pdf(pdf_file):
     """Convert PDF to images and extract text using OCR"""
     try:
-        # Convert PDF to images
-        images = convert_from_bytes(pdf_file.read())
+        # Render PDF pages as grayscale images, a budgeted batch at a time
+        pages = render_pages(pdf_file.read())
         
         # Extract text from each page
         all_text = ""
-        for image in images:
+        for page in pages:
             # Use pytesseract with English language option
-            text = pytesseract.image_to_string(image, lang='eng')
+            text = pytesseract.image_to_string(page, lang='eng')
             all_text += text + "\n"
             
         return all_text
@@ -44,6 +45,7 @@ def extract_text_from_pdf(pdf_file):
         return str(e)
 
 
+@timed('extract_pan_details')
 def extract_pan_details(text):
     """Parse the extracted text to get PAN card details"""
     details = {
@@ -0,0 +1,151 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import pstats
+import logging
+import cProfile
+import functools
+import threading
+from uuid import uuid4
+from flask import request, g, has_request_context
+
+# Opt-in request profiling, disabled unless PROFILE_REQUESTS is set
+PROFILE_ENABLED = os.environ.get('PROFILE_REQUESTS', '').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))  # Fraction of requests always kept
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 5000))  # Keep any request slower than this
+PROFILE_FOLDER = os.environ.get('PROFILE_FOLDER', 'profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))  # Number of traces kept on disk
+
+# Sort keys accepted by pstats, e.g. "cumulative" or "tottime"
+SORT_KEYS = set(pstats.Stats.sort_arg_dict_default)
+
+logger = logging.getLogger(__name__)
+
+# cProfile can only profile one request at a time (one sys.monitoring tool id on Python 3.12+)
+_profiler_lock = threading.Lock()
+
+def note(**fields):
+    """Attach extra fields (e.g. page count) to the trace of the current request"""
+    if PROFILE_ENABLED and has_request_context() and 'profile_trace' in g:
+        g.profile_trace.update(fields)
+
+def timed(name):
+    """Record how long a parser takes in the trace of the current request"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not (PROFILE_ENABLED and has_request_context() and 'profile_trace' in g):
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings = g.profile_trace.setdefault("timings_ms", {})
+                timings[name] = round((time.perf_counter() - start) * 1000, 2)
+        return wrapper
+    return decorator
+
+def profiled(func):
+    """Profile a request handler, keeping the trace if it was sampled or slow"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Requests arriving while another one is being profiled run unprofiled
+        if not PROFILE_ENABLED or not _profiler_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+
+        try:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiling tool is already active
+                logger.warning("Could not enable the profiler, running %s unprofiled", request.path)
+                return func(*args, **kwargs)
+
+            g.profile_trace = {
+                "endpoint": request.path,
+                "bytes": None,
+                "pages": None
+            }
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if elapsed_ms >= PROFILE_SLOW_MS or random.random() < PROFILE_SAMPLE_RATE:
+                    g.profile_trace["duration_ms"] = round(elapsed_ms, 2)
+                    try:
+                        _save(profiler, g.profile_trace)
+                    except Exception:
+                        # A lost trace must never fail the extraction itself
+                        logger.exception("Could not save the profile of %s", request.path)
+        finally:
+            _profiler_lock.release()
+    return wrapper
+
+def _save(profiler, trace):
+    """Write the profile and its metadata to the profile folder"""
+    if not os.path.exists(PROFILE_FOLDER):
+        os.makedirs(PROFILE_FOLDER)
+
+    trace_id = f"{int(time.time() * 1000)}-{trace['endpoint'].strip('/')}-{uuid4().hex[:12]}"
+    trace["id"] = trace_id
+    trace["created"] = time.time()
+    profiler.dump_stats(os.path.join(PROFILE_FOLDER, trace_id + '.prof'))
+    with open(os.path.join(PROFILE_FOLDER, trace_id + '.json'), 'w') as f:
+        json.dump(trace, f)
+
+    # Drop the oldest traces beyond the retention limit
+    for old in list_traces(sort_by="created")[PROFILE_KEEP:]:
+        for ext in ('.prof', '.json'):
+            path = os.path.join(PROFILE_FOLDER, old["id"] + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+def list_traces(limit=None, sort_by="duration_ms"):
+    """Return stored trace metadata, slowest (or newest) first"""
+    if not os.path.exists(PROFILE_FOLDER):
+        return []
+
+    traces = []
+    for name in os.listdir(PROFILE_FOLDER):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(PROFILE_FOLDER, name)) as f:
+                    traces.append(json.load(f))
+            except (OSError, ValueError):
+                # Skip traces that are being written or were removed meanwhile
+                continue
+    traces.sort(key=lambda trace: trace.get(sort_by) or 0, reverse=True)
+    return traces[:limit] if limit else traces
+
+def dump_trace(trace_id, sort_by="cumulative", limit=40):
+    """Return the pstats report of a stored trace, or None if it does not exist.
+    sort_by must be one of SORT_KEYS."""
+    path = os.path.join(PROFILE_FOLDER, os.path.basename(trace_id) + '.prof')
+    if not os.path.exists(path):
+        return None
+
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort_by).print_stats(limit)
+    return out.getvalue()
+
+if __name__ == '__main__':
+    # Usage: python profiling.py list [N] | dump <trace_id>
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'list':
+        limit = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+        for trace in list_traces(limit):
+            print(f"{trace['id']}  {trace['duration_ms']:>10.1f} ms  "
+                  f"pages={trace.get('pages')}  bytes={trace.get('bytes')}  "
+                  f"timings={trace.get('timings_ms', {})}")
+    elif command == 'dump' and len(sys.argv) > 2:
+        report = dump_trace(sys.argv[2])
+        print(report if report is not None else f"No trace named {sys.argv[2]}")
+    else:
+        print("Usage: python profiling.py list [N] | dump <trace_id>")
+        sys.exit(1)
@@ -0,0 +1,79 @@
+import pytest
+from PIL import Image
+
+import pages
+from pages import PageBudget, render_pages
+
+A4 = "595 x 842 pts (A4)"
+
+def fake_pdf(monkeypatch, sizes):
+    """Stub poppler with a PDF whose pages have the given sizes in points"""
+    calls = []
+
+    def pdfinfo_from_path(pdf_path, first_page=None, last_page=None):
+        info = {"Pages": len(sizes)}
+        for number, size in enumerate(sizes, start=1):
+            info[f"Page {number:4d} size"] = size
+        return info
+
+    def convert_from_path(pdf_path, dpi, first_page, last_page, grayscale):
+        calls.append((first_page, last_page))
+        images = []
+        for size in sizes[first_page - 1:last_page]:
+            width, height = (float(part) for part in size.split()[0:3:2])
+            images.append(Image.new('L', (int(width / 72 * dpi), int(height / 72 * dpi))))
+        return images
+
+    monkeypatch.setattr(pages, 'pdfinfo_from_path', pdfinfo_from_path)
+    monkeypatch.setattr(pages, 'convert_from_path', convert_from_path)
+    return calls
+
+def test_single_page_renders_once(monkeypatch):
+    calls = fake_pdf(monkeypatch, [A4])
+    rendered = list(render_pages(b'%PDF'))
+    assert calls == [(1, 1)]
+    assert len(rendered) == 1
+    assert rendered[0].mode == 'L'
+
+def test_document_within_budget_is_one_batch(monkeypatch):
+    calls = fake_pdf(monkeypatch, [A4] * 3)
+    assert len(list(render_pages(b'%PDF'))) == 3
+    assert calls == [(1, 3)]
+
+def test_batches_split_at_budget(monkeypatch):
+    calls = fake_pdf(monkeypatch, [A4] * 5)
+    budget = PageBudget(limit=4 * pages._page_bytes(595, 842))
+    assert len(list(render_pages(b'%PDF', budget))) == 5
+    assert calls == [(1, 2), (3, 4), (5, 5)]
+    assert budget.live_bytes == 0
+    assert budget.peak_bytes <= budget.limit
+
+def test_budget_smaller_than_a_page(monkeypatch):
+    calls = fake_pdf(monkeypatch, [A4] * 3)
+    budget = PageBudget(limit=1)
+    assert len(list(render_pages(b'%PDF', budget))) == 3
+    assert calls == [(1, 1), (2, 2), (3, 3)]
+
+def test_mixed_page_sizes_stay_within_budget(monkeypatch):
+    small, large = "100 x 100 pts", "1190 x 1684 pts (A2)"
+    calls = fake_pdf(monkeypatch, [small, large, large, large])
+    budget = PageBudget(limit=4 * pages._page_bytes(1190, 1684))
+    list(render_pages(b'%PDF', budget))
+    assert budget.peak_bytes <= budget.limit
+    # The small first page must not size the batches of the large pages after it
+    assert calls == [(1, 2), (3, 4)]
+
+def test_plan():
+    # Each page costs twice its size while pdf2image decodes it
+    assert PageBudget(limit=20).plan([4, 4, 4, 20, 1]) == [(1, 2), (3, 3), (4, 4), (5, 5)]
+    assert PageBudget(limit=10).plan([]) == []
+
+def test_budget_is_released_when_ocr_fails(monkeypatch):
+    fake_pdf(monkeypatch, [A4] * 3)
+    budget = PageBudget()
+    generator = render_pages(b'%PDF', budget)
+    next(generator)
+    with pytest.raises(RuntimeError):
+        generator.throw(RuntimeError("tesseract failed"))
+    assert budget.pages == 1
+    assert budget.live_bytes == 0
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import pytest
+from flask import Flask
+
+import profiling
+import app as backend
+
+@pytest.fixture
+def traces(monkeypatch, tmp_path):
+    """Enable profiling, keeping every request, with traces in a temporary folder"""
+    monkeypatch.setattr(profiling, 'PROFILE_ENABLED', True)
+    monkeypatch.setattr(profiling, 'PROFILE_SLOW_MS', 0)
+    monkeypatch.setattr(profiling, 'PROFILE_FOLDER', str(tmp_path))
+    monkeypatch.setattr(backend, 'PROFILE_ENABLED', True)
+    return tmp_path
+
+@pytest.fixture
+def client():
+    """A client for a stand-in extract endpoint that reports like the real pipeline"""
+    test_app = Flask(__name__)
+
+    @profiling.timed('extract_test_details')
+    def parse():
+        return "parsed"
+
+    @test_app.route('/extract_test', methods=['POST'])
+    @profiling.profiled
+    def extract_test():
+        profiling.note(bytes=1234, pages=2)
+        return parse()
+
+    return test_app.test_client()
+
+def stored(folder):
+    return sorted(name for name in os.listdir(folder))
+
+def test_slow_request_is_stored(traces, client):
+    response = client.post('/extract_test')
+    assert response.data == b'parsed'
+
+    names = stored(traces)
+    assert len(names) == 2
+    assert names[0].endswith('.json') and names[1].endswith('.prof')
+    with open(traces / names[0]) as f:
+        trace = json.load(f)
+    assert trace["bytes"] == 1234
+    assert trace["pages"] == 2
+    assert "extract_test_details" in trace["timings_ms"]
+
+def test_fast_request_is_not_stored(traces, client, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_SLOW_MS', 60 * 1000)
+    client.post('/extract_test')
+    assert stored(traces) == []
+
+def test_request_runs_unprofiled_while_lock_is_held(traces, client):
+    with profiling._profiler_lock:
+        response = client.post('/extract_test')
+    assert response.data == b'parsed'
+    assert stored(traces) == []
+
+def test_failing_save_still_returns_response(traces, client, monkeypatch):
+    def fail(profiler, trace):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(profiling, '_save', fail)
+    response = client.post('/extract_test')
+    assert response.status_code == 200
+    assert response.data == b'parsed'
+
+def test_only_newest_traces_are_kept(traces, client, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_KEEP', 2)
+    for _ in range(4):
+        client.post('/extract_test')
+        time.sleep(0.01)
+    assert len(profiling.list_traces()) == 2
+    assert len(stored(traces)) == 4
+
+def test_unreadable_trace_is_skipped(traces, client):
+    client.post('/extract_test')
+    (traces / 'partial.json').write_text('{')
+    assert len(profiling.list_traces()) == 1
+
+def test_profile_report(traces, client):
+    client.post('/extract_test')
+    trace_id = profiling.list_traces()[0]["id"]
+    api = backend.app.test_client()
+
+    response = api.get(f'/profiles/{trace_id}?sort=tottime')
+    assert response.status_code == 200
+    assert b'function calls' in response.data
+
+    assert api.get(f'/profiles/{trace_id}?sort=bogus').status_code == 400
+    assert api.get('/profiles/missing').status_code == 404
+    assert api.get('/profiles').get_json()["data"][0]["id"] == trace_id